@@ -129,6 +129,10 @@ with utils_impl.record_new_flags() as hparam_flags:
       'Wasserstein GAN Loss')
   flags.DEFINE_integer('noise_dim', 128,
                        'Dimension of the generator input space.')
+  flags.DEFINE_boolean(
+      'jit_compile', False,
+      'If True, the single-batch generator and discriminator training steps '
+      'are compiled with XLA.')
 
   # Controls output data frequency.
   flags.DEFINE_integer(
@@ -303,7 +307,7 @@ def _get_emnist_eval_hook_fn(exp_name, output_dir, hparams_dict, gan_loss_fns,
 def _get_gan(gen_model_fn, disc_model_fn, gan_loss_fns, gen_optimizer,
              disc_optimizer, server_gen_inputs_dataset,
              client_real_images_tff_data, use_dp, dp_l2_norm_clip,
-             dp_noise_multiplier, clients_per_round):
+             dp_noise_multiplier, clients_per_round, jit_compile=False):
   """Construct instance of tff_gans.GanFnsAndTypes class."""
   dummy_gen_input = next(iter(server_gen_inputs_dataset))
   dummy_real_data = next(
@@ -312,9 +316,9 @@ def _get_gan(gen_model_fn, disc_model_fn, gan_loss_fns, gen_optimizer,
               client_real_images_tff_data.client_ids[0])))
 
   train_generator_fn = gan_training_tf_fns.create_train_generator_fn(
-      gan_loss_fns, gen_optimizer)
+      gan_loss_fns, gen_optimizer, jit_compile=jit_compile)
   train_discriminator_fn = gan_training_tf_fns.create_train_discriminator_fn(
-      gan_loss_fns, disc_optimizer)
+      gan_loss_fns, disc_optimizer, jit_compile=jit_compile)
 
   dp_average_query = None
   if use_dp:
@@ -466,7 +470,8 @@ def main(argv):
       use_dp=FLAGS.use_dp,
       dp_l2_norm_clip=FLAGS.dp_l2_norm_clip,
       dp_noise_multiplier=FLAGS.dp_noise_multiplier,
-      clients_per_round=FLAGS.num_clients_per_round)
+      clients_per_round=FLAGS.num_clients_per_round,
+      jit_compile=FLAGS.jit_compile)
 
   # Training.
   _, tff_time = _train(
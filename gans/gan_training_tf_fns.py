@@ -91,6 +91,20 @@ class ClientOutput(object):
   counters = attr.ib()
 
 
+# Set cmp=False to get a default hash function for tf.function.
+@attr.s(eq=False, frozen=True)
+class AggregatedClientOutput(object):
+  """Container for the client outputs after aggregation on the server.
+
+  Attributes:
+    discriminator_weights_delta: Aggregated update for the discriminator model,
+      in the order of `tf.keras.Model.weights`.
+    counters: Metrics that are summed across clients.
+  """
+  discriminator_weights_delta = attr.ib()
+  counters = attr.ib()
+
+
 def _weights(model):
   """Returns tensors of model weights, in the order of the variables."""
   return [v.read_value() for v in model.weights]
@@ -159,9 +173,15 @@ def client_computation(
 
 def server_initial_state(generator, discriminator):
   """Returns the initial state of the server."""
+  return server_initial_state_from_weights(
+      _weights(generator), _weights(discriminator))
+
+
+def server_initial_state_from_weights(generator_weights, discriminator_weights):
+  """Returns the initial state of the server, given initial model weights."""
   return ServerState(
-      generator_weights=_weights(generator),
-      discriminator_weights=_weights(discriminator),
+      generator_weights=generator_weights,
+      discriminator_weights=discriminator_weights,
       counters={
           'num_rounds': tf.constant(0),
           'num_generator_train_examples': tf.constant(0),
@@ -175,7 +195,7 @@ def server_computation(
     # Tensor/Dataset arguments that will be supplied by TFF:
     server_state: ServerState,
     gen_inputs_ds: tf.data.Dataset,
-    client_output: ClientOutput,
+    client_output: AggregatedClientOutput,
     # Python arguments to be bound at TFF computation construction time:
     generator: tf.keras.Model,
     discriminator: tf.keras.Model,
@@ -187,7 +207,8 @@ def server_computation(
   Args:
     server_state: The initial `ServerState` for the round.
     gen_inputs_ds: An infinite `tf.data.Dataset` of inputs to the `generator`.
-    client_output: The (possibly aggregated) `ClientOutput`.
+    client_output: An `AggregatedClientOutput`, or a single client's
+      `ClientOutput`.
     generator:  The generator.
     discriminator: The discriminator.
     server_disc_update_optimizer: Optimizer used to `apply_gradients` based on
@@ -238,13 +259,16 @@ def server_computation(
 
 
 def create_train_generator_fn(gan_loss_fns: gan_losses.AbstractGanLossFns,
-                              gen_optimizer: tf.keras.optimizers.Optimizer):
+                              gen_optimizer: tf.keras.optimizers.Optimizer,
+                              jit_compile: bool = False):
   """Create a function that trains generator, binding loss and optimizer.
 
   Args:
     gan_loss_fns: Instance of gan_losses.AbstractGanLossFns interface,
       specifying the generator/discriminator training losses.
     gen_optimizer: Optimizer for training the generator.
+    jit_compile: If True, the single-batch training step (forward pass, loss
+      and optimizer update) is compiled with XLA. Defaults to False.
 
   Returns:
     Function that executes one step of generator training.
@@ -258,7 +282,7 @@ def create_train_generator_fn(gan_loss_fns: gan_losses.AbstractGanLossFns,
         'Expected gen_optimizer to not have been used previously, but '
         'variables were already initialized.')
 
-  @tf.function
+  @tf.function(jit_compile=jit_compile)
   def train_generator_fn(generator: tf.keras.Model,
                          discriminator: tf.keras.Model, generator_inputs):
     """Trains the generator on a single batch.
@@ -286,13 +310,16 @@ def create_train_generator_fn(gan_loss_fns: gan_losses.AbstractGanLossFns,
 
 def create_train_discriminator_fn(
     gan_loss_fns: gan_losses.AbstractGanLossFns,
-    disc_optimizer: tf.keras.optimizers.Optimizer):
+    disc_optimizer: tf.keras.optimizers.Optimizer,
+    jit_compile: bool = False):
   """Create a function that trains discriminator, binding loss and optimizer.
 
   Args:
     gan_loss_fns: Instance of gan_losses.AbstractGanLossFns interface,
       specifying the generator/discriminator training losses.
     disc_optimizer: Optimizer for training the discriminator.
+    jit_compile: If True, the single-batch training step (forward pass, loss
+      and optimizer update) is compiled with XLA. Defaults to False.
 
   Returns:
     Function that executes one step of discriminator training.
@@ -306,7 +333,7 @@ def create_train_discriminator_fn(
         'Expected disc_optimizer to not have been used previously, but '
         'variables were already initialized.')
 
-  @tf.function
+  @tf.function(jit_compile=jit_compile)
   def train_discriminator_fn(generator: tf.keras.Model,
                              discriminator: tf.keras.Model, generator_inputs,
                              real_data):
@@ -45,6 +45,33 @@ class GanTrainingTfFnsTest(tf.test.TestCase):
         ['generator', 'discriminator', 'generator_inputs', 'real_data'],
         train_discriminator_fn.function_spec.fullargspec.args)
 
+  def test_create_train_fns_with_jit_compile(self):
+    train_generator_fn = gan_training_tf_fns.create_train_generator_fn(
+        GAN_LOSS_FNS, tf.keras.optimizers.Adam(), jit_compile=True)
+    train_discriminator_fn = gan_training_tf_fns.create_train_discriminator_fn(
+        GAN_LOSS_FNS, tf.keras.optimizers.Adam(), jit_compile=True)
+
+    generator = one_dim_gan.create_generator()
+    discriminator = one_dim_gan.create_discriminator()
+    gen_inputs = next(iter(one_dim_gan.create_generator_inputs()))
+    real_data = next(iter(one_dim_gan.create_real_data()))
+
+    initial_gen_weights = self.evaluate(generator.trainable_variables)
+    self.assertEqual(
+        self.evaluate(
+            train_generator_fn(generator, discriminator, gen_inputs)),
+        one_dim_gan.BATCH_SIZE)
+    self.assertNotAllClose(initial_gen_weights,
+                           self.evaluate(generator.trainable_variables))
+
+    initial_disc_weights = self.evaluate(discriminator.trainable_variables)
+    self.assertEqual(
+        self.evaluate(
+            train_discriminator_fn(generator, discriminator, gen_inputs,
+                                   real_data)), one_dim_gan.BATCH_SIZE)
+    self.assertNotAllClose(initial_disc_weights,
+                           self.evaluate(discriminator.trainable_variables))
+
   def test_client_and_server_computations(self):
     train_generator_fn, train_discriminator_fn = (
         _get_train_generator_and_discriminator_fns())
@@ -14,8 +14,10 @@
 """TFF orchestration logic for Federated GANs."""
 
 import attr
+import numpy as np
 import tensorflow as tf
 import tensorflow_federated as tff
+from tensorflow_model_optimization.python.core.internal import tensor_encoding as te
 import tensorflow_privacy
 
 from gans import gan_training_tf_fns
@@ -28,17 +30,48 @@ def tensor_spec_for_batch(dummy_batch):
     dummy_batch = dummy_batch._asdict()
 
   def _get_tensor_spec(tensor):
-    # Convert input to tensors, possibly from nested lists that need to be
-    # converted to a single top-level tensor.
-    tensor = tf.convert_to_tensor(tensor)
+    # Tensors and numeric/bool numpy arrays already carry their shape and
+    # dtype; only convert other inputs, e.g. string or object arrays, or nested
+    # lists that need to be converted to a single top-level tensor.
+    is_numeric_array = (
+        isinstance(tensor, np.ndarray) and tensor.dtype.kind in 'biufc')
+    if not (isinstance(tensor, tf.Tensor) or is_numeric_array):
+      tensor = tf.convert_to_tensor(tensor)
+    shape = tf.TensorShape(tensor.shape)
     # Remove the batch dimension and leave it unspecified.
     spec = tf.TensorSpec(
-        shape=[None] + tensor.shape.dims[1:], dtype=tensor.dtype)
+        shape=[None] + shape.dims[1:], dtype=tf.as_dtype(tensor.dtype))
     return spec
 
   return tf.nest.map_structure(_get_tensor_spec, dummy_batch)
 
 
+def _build_quantizing_encoder_fn(quantization_bits, quantization_threshold):
+  """Returns an encoder fn for `tff.aggregators.EncodedSumFactory`.
+
+  Only tensors with more than `quantization_threshold` elements are quantized;
+  for smaller tensors the quantization parameters cost more than they save, so
+  these are sent as is.
+
+  Args:
+    quantization_bits: Number of bits used for uniform quantization.
+    quantization_threshold: Minimum number of elements a tensor must exceed to
+      be quantized.
+
+  Returns:
+    A function mapping a `tf.TensorSpec` to a `te.core.GatherEncoder`.
+  """
+
+  def encoder_fn(spec):
+    if spec.shape.num_elements() > quantization_threshold:
+      return te.encoders.as_gather_encoder(
+          te.encoders.uniform_quantization(quantization_bits), spec)
+    else:
+      return te.encoders.as_gather_encoder(te.encoders.identity(), spec)
+
+  return encoder_fn
+
+
 # Set cmp=False to get a default hash function for tf.function.
 @attr.s(eq=False, frozen=False)
 class GanFnsAndTypes(object):
@@ -79,6 +112,18 @@ class GanFnsAndTypes(object):
   # `privacy.NormalizedQuery`.
   train_discriminator_dp_average_query = attr.ib(
       type=tensorflow_privacy.DPQuery, default=None)
+  # Number of bits (between 1 and 16) used to uniformly quantize the
+  # discriminator weight deltas sent from clients to the server. Defaults to
+  # `None`, meaning the deltas are sent unquantized. Only supported when no DP
+  # query is specified.
+  discriminator_delta_quantization_bits = attr.ib(type=int, default=None)
+  # If quantizing, only weight deltas with more elements than this threshold
+  # are quantized; smaller ones (e.g., biases) are sent unquantized.
+  discriminator_delta_quantization_threshold = attr.ib(type=int, default=10000)
+  # Whether the non-DP aggregation averages the discriminator deltas uniformly
+  # across clients, instead of weighting them by the number of examples trained
+  # on. Uniform averaging avoids aggregating the client weights.
+  use_unweighted_mean = attr.ib(type=bool, default=False)
 
   # TF Types for the above, all (structures of) `tf.TensorSpec`.
   gen_input_type = attr.ib(init=False)
@@ -87,6 +132,10 @@ class GanFnsAndTypes(object):
   generator_weights_type = attr.ib(init=False)
   discriminator_weights_type = attr.ib(init=False)
 
+  # Dataset types
+  gen_input_sequence_type = attr.ib(init=False, type=tff.SequenceType)
+  real_data_sequence_type = attr.ib(init=False, type=tff.SequenceType)
+
   # Federated dataset types
   client_gen_input_type = attr.ib(init=False, type=tff.FederatedType)
   client_real_data_type = attr.ib(init=False, type=tff.FederatedType)
@@ -96,15 +145,31 @@ class GanFnsAndTypes(object):
   # specified, this will be used to perform the aggregation steps (clipping,
   # noising) necessary for differential privacy (DP). If
   # `train_discriminator_dp_average_query` (i.e., no DP), this will be a simple
-  # stateless mean.
+  # stateless (possibly unweighted) mean, optionally of quantized deltas.
   aggregation_process = attr.ib(
       init=False, type=tff.templates.AggregationProcess, default=None)
 
+  # Weights of the sample generator and discriminator below, as lists of numpy
+  # arrays. These are used as the initial weights in the server state.
+  initial_generator_weights = attr.ib(init=False)
+  initial_discriminator_weights = attr.ib(init=False)
+
   # Sample generator and discriminator.
   _generator = attr.ib(init=False)
   _discriminator = attr.ib(init=False)
 
   def __attrs_post_init__(self):
+    if (self.train_discriminator_dp_average_query is not None and
+        self.discriminator_delta_quantization_bits is not None):
+      raise ValueError(
+          'Quantization of discriminator deltas is not supported together '
+          'with a `train_discriminator_dp_average_query`.')
+    if (self.discriminator_delta_quantization_bits is not None and
+        not 1 <= self.discriminator_delta_quantization_bits <= 16):
+      raise ValueError(
+          '`discriminator_delta_quantization_bits` must be between 1 and 16, '
+          'found {}.'.format(self.discriminator_delta_quantization_bits))
+
     self.gen_input_type = tensor_spec_for_batch(self.dummy_gen_input)
     self.real_data_type = tensor_spec_for_batch(self.dummy_real_data)
 
@@ -121,38 +186,58 @@ class GanFnsAndTypes(object):
           type(self._discriminator)))
 
     def vars_to_type(var_struct):
-      # TODO(b/131681951): read_value() shouldn't be needed
-      return tf.nest.map_structure(
-          lambda v: tf.TensorSpec.from_tensor(v.read_value()), var_struct)
+      return tf.nest.map_structure(lambda v: tf.TensorSpec(v.shape, v.dtype),
+                                   var_struct)
 
     self.discriminator_weights_type = vars_to_type(self._discriminator.weights)
     self.generator_weights_type = vars_to_type(self._generator.weights)
+    self.initial_generator_weights = self._generator.get_weights()
+    self.initial_discriminator_weights = self._discriminator.get_weights()
 
     self.from_server_type = gan_training_tf_fns.FromServer(
         generator_weights=self.generator_weights_type,
         discriminator_weights=self.discriminator_weights_type)
 
+    self.gen_input_sequence_type = tff.SequenceType(self.gen_input_type)
+    self.real_data_sequence_type = tff.SequenceType(self.real_data_type)
+
     self.client_gen_input_type = tff.type_at_clients(
-        tff.SequenceType(self.gen_input_type))
+        self.gen_input_sequence_type)
     self.client_real_data_type = tff.type_at_clients(
-        tff.SequenceType(self.real_data_type))
+        self.real_data_sequence_type)
     self.server_gen_input_type = tff.type_at_server(
-        tff.SequenceType(self.gen_input_type))
+        self.gen_input_sequence_type)
 
+    disc_value_type = tff.to_type(self.discriminator_weights_type)
     if self.train_discriminator_dp_average_query is not None:
       self.aggregation_process = tff.aggregators.DifferentiallyPrivateFactory(
           query=self.train_discriminator_dp_average_query).create(
-              value_type=tff.to_type(self.discriminator_weights_type))
+              value_type=disc_value_type)
     else:
-      self.aggregation_process = tff.aggregators.MeanFactory().create(
-          value_type=tff.to_type(self.discriminator_weights_type),
-          weight_type=tff.to_type(tf.float32))
+      if self.discriminator_delta_quantization_bits is not None:
+        value_sum_factory = tff.aggregators.EncodedSumFactory(
+            _build_quantizing_encoder_fn(
+                self.discriminator_delta_quantization_bits,
+                self.discriminator_delta_quantization_threshold))
+      else:
+        value_sum_factory = None
+      if self.use_unweighted_mean:
+        self.aggregation_process = tff.aggregators.UnweightedMeanFactory(
+            value_sum_factory).create(value_type=disc_value_type)
+      else:
+        self.aggregation_process = tff.aggregators.MeanFactory(
+            value_sum_factory).create(
+                value_type=disc_value_type,
+                weight_type=tff.to_type(tf.float32))
 
 
 def build_server_initial_state_comp(gan: GanFnsAndTypes):
   """Returns a `tff.tf_computation` for the `server_initial_state`.
 
-  This is a thin wrapper around `gan_training_tf_fns.server_initial_state`.
+  This is a thin wrapper around
+  `gan_training_tf_fns.server_initial_state_from_weights`. The initial model
+  weights are those of the sample generator and discriminator already built by
+  `gan`, so no models are constructed in the computation.
 
   Args:
      gan: A `GanFnsAndTypes` object.
@@ -163,9 +248,13 @@ def build_server_initial_state_comp(gan: GanFnsAndTypes):
 
   @tff.tf_computation
   def server_initial_state():
-    generator = gan.generator_model_fn()
-    discriminator = gan.discriminator_model_fn()
-    return gan_training_tf_fns.server_initial_state(generator, discriminator)
+    return gan_training_tf_fns.server_initial_state_from_weights(
+        generator_weights=[
+            tf.constant(w) for w in gan.initial_generator_weights
+        ],
+        discriminator_weights=[
+            tf.constant(w) for w in gan.initial_discriminator_weights
+        ])
 
   return server_initial_state
 
@@ -182,14 +271,13 @@ def build_client_computation(gan: GanFnsAndTypes):
     A `tff.tf_computation.`
   """
 
-  @tff.tf_computation(
-      tff.SequenceType(gan.gen_input_type),
-      tff.SequenceType(gan.real_data_type), gan.from_server_type)
+  @tff.tf_computation(gan.gen_input_sequence_type, gan.real_data_sequence_type,
+                      gan.from_server_type)
   def client_computation(gen_inputs, real_data, from_server):
     """Returns the client_output."""
     return gan_training_tf_fns.client_computation(
-        gen_inputs_ds=gen_inputs,
-        real_data_ds=real_data,
+        gen_inputs_ds=gen_inputs.prefetch(tf.data.experimental.AUTOTUNE),
+        real_data_ds=real_data.prefetch(tf.data.experimental.AUTOTUNE),
         from_server=from_server,
         generator=gan.generator_model_fn(),
         discriminator=gan.discriminator_model_fn(),
@@ -199,7 +287,7 @@ def build_client_computation(gan: GanFnsAndTypes):
 
 
 def build_server_computation(gan: GanFnsAndTypes, server_state_type: tff.Type,
-                             client_output_type: tff.Type,
+                             aggregated_client_output_type: tff.Type,
                              aggregation_state_type: tff.Type):
   """Returns a `tff.tf_computation` for the `server_computation`.
 
@@ -208,7 +296,8 @@ def build_server_computation(gan: GanFnsAndTypes, server_state_type: tff.Type,
   Args:
     gan: A `GanFnsAndTypes` object.
     server_state_type: The `tff.Type` of the ServerState.
-    client_output_type: The `tff.Type` of the ClientOutput.
+    aggregated_client_output_type: The `tff.Type` of the
+      AggregatedClientOutput.
     aggregation_state_type: The `tff.Type` of the state of the
       tff.templates.AggregationProcess.
 
@@ -216,14 +305,14 @@ def build_server_computation(gan: GanFnsAndTypes, server_state_type: tff.Type,
     A `tff.tf_computation.`
   """
 
-  @tff.tf_computation(server_state_type, tff.SequenceType(gan.gen_input_type),
-                      client_output_type, aggregation_state_type)
+  @tff.tf_computation(server_state_type, gan.gen_input_sequence_type,
+                      aggregated_client_output_type, aggregation_state_type)
   def server_computation(server_state, gen_inputs, client_output,
                          new_aggregation_state):
     """The wrapped server_computation."""
     return gan_training_tf_fns.server_computation(
         server_state=server_state,
-        gen_inputs_ds=gen_inputs,
+        gen_inputs_ds=gen_inputs.prefetch(tf.data.experimental.AUTOTUNE),
         client_output=client_output,
         generator=gan.generator_model_fn(),
         discriminator=gan.discriminator_model_fn(),
@@ -261,6 +350,15 @@ def build_gan_training_process(gan: GanFnsAndTypes):
             aggregation_state=gan.aggregation_process.initialize()))
     return server_initial_state
 
+  aggregated_client_output_type = tff.to_type(
+      gan_training_tf_fns.AggregatedClientOutput(
+          discriminator_weights_delta=(
+              client_output_type.discriminator_weights_delta),
+          counters=client_output_type.counters))
+  server_computation = build_server_computation(
+      gan, fed_server_initial_state.type_signature.result.member,
+      aggregated_client_output_type, gan.aggregation_process.state_type.member)
+
   @tff.federated_computation(fed_server_initial_state.type_signature.result,
                              gan.server_gen_input_type,
                              gan.client_gen_input_type,
@@ -276,8 +374,9 @@ def build_gan_training_process(gan: GanFnsAndTypes):
         client_computation, (client_gen_inputs, client_real_data, client_input))
 
     # Note that weight goes unused here if the aggregation is involving
-    # Differential Privacy; the underlying AggregationProcess doesn't take the
-    # parameter, as it just uniformly weights the clients.
+    # Differential Privacy or `use_unweighted_mean` is set; the underlying
+    # AggregationProcess doesn't take the parameter, as it just uniformly
+    # weights the clients.
     if gan.aggregation_process.is_weighted:
       aggregation_output = gan.aggregation_process.next(
           server_state.aggregation_state,
@@ -291,20 +390,10 @@ def build_gan_training_process(gan: GanFnsAndTypes):
     new_aggregation_state = aggregation_output.state
     averaged_discriminator_weights_delta = aggregation_output.result
 
-    # TODO(b/131085687): Perhaps reconsider the choice to also use
-    # ClientOutput to hold the aggregated client output.
-    aggregated_client_output = gan_training_tf_fns.ClientOutput(
+    aggregated_client_output = gan_training_tf_fns.AggregatedClientOutput(
         discriminator_weights_delta=averaged_discriminator_weights_delta,
-        # We don't actually need the aggregated update_weight, but
-        # this keeps the types of the non-aggregated and aggregated
-        # client_output the same, which is convenient. And I can
-        # imagine wanting this.
-        update_weight=tff.federated_sum(client_outputs.update_weight),
         counters=tff.federated_sum(client_outputs.counters))
 
-    server_computation = build_server_computation(
-        gan, server_state.type_signature.member, client_output_type,
-        gan.aggregation_process.state_type.member)
     server_state = tff.federated_map(
         server_computation, (server_state, server_gen_inputs,
                              aggregated_client_output, new_aggregation_state))
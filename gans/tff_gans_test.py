@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from absl.testing import parameterized
+import numpy as np
 import tensorflow as tf
 import tensorflow_federated as tff
 import tensorflow_privacy
@@ -34,8 +35,12 @@ AFTER_2_RDS_DP_STD_DEV = 30.1439991
 
 UPDATE_DP_L2_NORM_CLIP = 500.0
 
+# Quantize all discriminator weight deltas except the single-element bias of
+# the output layer, since the one-dimensional GAN only has small tensors.
+QUANTIZATION_THRESHOLD = 1
 
-def _get_gan(with_dp=False):
+
+def _get_gan(with_dp=False, quantization_bits=None, use_unweighted_mean=False):
   gan_loss_fns = gan_losses.get_gan_loss_fns('wasserstein')
   server_gen_optimizer = tf.keras.optimizers.Adam()
   client_disc_optimizer = tf.keras.optimizers.Adam()
@@ -66,11 +71,27 @@ def _get_gan(with_dp=False):
       train_generator_fn=train_generator_fn,
       train_discriminator_fn=train_discriminator_fn,
       server_disc_update_optimizer_fn=lambda: tf.keras.optimizers.SGD(lr=1.0),
-      train_discriminator_dp_average_query=dp_average_query)
+      train_discriminator_dp_average_query=dp_average_query,
+      discriminator_delta_quantization_bits=quantization_bits,
+      discriminator_delta_quantization_threshold=QUANTIZATION_THRESHOLD,
+      use_unweighted_mean=use_unweighted_mean)
 
 
 class TffGansTest(tf.test.TestCase, parameterized.TestCase):
 
+  def test_tensor_spec_for_batch(self):
+    dummy_batch = {
+        'tensor': tf.zeros([4, 2], dtype=tf.float32),
+        'array': np.zeros([4, 3, 5], dtype=np.int32),
+        'string_array': np.array(['a', 'b', 'c', 'd']),
+    }
+    self.assertEqual(
+        tff_gans.tensor_spec_for_batch(dummy_batch), {
+            'tensor': tf.TensorSpec(shape=[None, 2], dtype=tf.float32),
+            'array': tf.TensorSpec(shape=[None, 3, 5], dtype=tf.int32),
+            'string_array': tf.TensorSpec(shape=[None], dtype=tf.string),
+        })
+
   @parameterized.named_parameters(('no_dp', False), ('dp', True))
   def test_build_server_initial_state_comp(self, with_dp):
     gan = _get_gan(with_dp)
@@ -92,6 +113,12 @@ class TffGansTest(tf.test.TestCase, parameterized.TestCase):
     # depending on setup) is initialized to empty.
     self.assertEmpty(server_state.aggregation_state)
 
+    # Check that the model weights are those of the models built by `gan`.
+    self.assertAllClose(server_state.generator_weights,
+                        gan.initial_generator_weights)
+    self.assertAllClose(server_state.discriminator_weights,
+                        gan.initial_discriminator_weights)
+
   @parameterized.named_parameters(('no_dp', False), ('dp', True))
   def test_client_computation(self, with_dp):
     gan = _get_gan(with_dp)
@@ -115,18 +142,17 @@ class TffGansTest(tf.test.TestCase, parameterized.TestCase):
     gan = _get_gan(with_dp)
     initial_state_comp = tff_gans.build_server_initial_state_comp(gan)
 
-    # TODO(b/131700944): Remove this workaround, and directly instantiate a
-    # ClientOutput instance (once TFF has a utility to infer TFF types of
-    # objects directly).
+    # TODO(b/131700944): Remove this workaround, and directly instantiate an
+    # AggregatedClientOutput instance (once TFF has a utility to infer TFF
+    # types of objects directly).
     @tff.tf_computation
     def client_output_fn():
       discriminator = gan.discriminator_model_fn()
-      return gan_training_tf_fns.ClientOutput(
+      return gan_training_tf_fns.AggregatedClientOutput(
           discriminator_weights_delta=[
               tf.zeros(shape=v.shape, dtype=v.dtype)
               for v in discriminator.weights
           ],
-          update_weight=1.0,
           counters={'num_discriminator_train_examples': 13})
 
     def _update_aggregation_state(with_dp, aggregation_state):
@@ -244,6 +270,66 @@ class TffGansTest(tf.test.TestCase, parameterized.TestCase):
           AFTER_2_RDS_DP_STD_DEV,
           places=5)
 
+  @parameterized.named_parameters(
+      ('quantization', 8, False),
+      ('unweighted_mean', None, True),
+      ('quantization_unweighted_mean', 8, True),
+  )
+  def test_build_gan_training_process_with_aggregation_options(
+      self, quantization_bits, use_unweighted_mean):
+    gan = _get_gan(
+        quantization_bits=quantization_bits,
+        use_unweighted_mean=use_unweighted_mean)
+    self.assertEqual(gan.aggregation_process.is_weighted,
+                     not use_unweighted_mean)
+    process = tff_gans.build_gan_training_process(gan)
+    server_state = process.initialize()
+
+    server_state = process.next(server_state,
+                                one_dim_gan.create_generator_inputs().take(1),
+                                [one_dim_gan.create_generator_inputs().take(2)],
+                                [one_dim_gan.create_real_data().take(2)])
+
+    self.assertDictEqual(
+        server_state.counters, {
+            'num_rounds': 1,
+            'num_generator_train_examples': one_dim_gan.BATCH_SIZE,
+            'num_discriminator_train_examples': 2 * one_dim_gan.BATCH_SIZE,
+        })
+
+  @parameterized.named_parameters(('weighted', False), ('unweighted', True))
+  def test_quantized_aggregation(self, use_unweighted_mean):
+    gan = _get_gan(quantization_bits=8, use_unweighted_mean=use_unweighted_mean)
+    client_deltas = [[
+        np.random.uniform(-1.0, 1.0, size=spec.shape.as_list()).astype(
+            np.float32)
+        for spec in gan.discriminator_weights_type
+    ] for _ in range(2)]
+    expected_mean = [(a + b) / 2.0 for a, b in zip(*client_deltas)]
+
+    state = gan.aggregation_process.initialize()
+    if use_unweighted_mean:
+      output = gan.aggregation_process.next(state, client_deltas)
+    else:
+      output = gan.aggregation_process.next(state, client_deltas, [1.0, 1.0])
+
+    # With 8 bits and values in [-1, 1], each quantized value is off by at most
+    # one quantization step of 2 / 255.
+    self.assertAllClose(output.result, expected_mean, atol=2.0 / 255)
+    self.assertNotAllClose(output.result, expected_mean, atol=1e-6)
+    # The single-element bias of the output layer is below the threshold, and
+    # so is averaged exactly.
+    self.assertAllClose(output.result[-1], expected_mean[-1])
+
+  def test_quantization_with_dp_raises(self):
+    with self.assertRaises(ValueError):
+      _get_gan(with_dp=True, quantization_bits=8)
+
+  @parameterized.named_parameters(('zero', 0), ('too_many', 17))
+  def test_invalid_quantization_bits_raises(self, quantization_bits):
+    with self.assertRaises(ValueError):
+      _get_gan(quantization_bits=quantization_bits)
+
 
 if __name__ == '__main__':
   tf.test.main()